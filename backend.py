@@ -12,22 +12,53 @@ import os
 import time
 import json
 import traceback
+import queue
+import threading
+import itertools
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from glob import glob
 from urllib.parse import unquote
 from io import BytesIO
+from functools import lru_cache
 
 from flask import Flask, request, jsonify, send_file, render_template, abort
 from flask_cors import CORS
-from PIL import Image
+from PIL import Image, ImageOps
+import numpy as np
 
 # Try import ultralytics
 try:
     from ultralytics import YOLO
+    import cv2  # installed with ultralytics; used to draw boxes
     ULTRALYTICS_AVAILABLE = True
 except Exception as e:
     ULTRALYTICS_AVAILABLE = False
     YOLO = None
+    cv2 = None
+
+# Pieces for feeding the model pre-letterboxed tensors (see run_model_preprocessed)
+try:
+    import torch
+    from ultralytics.engine.results import Results
+    from ultralytics.utils import ops
+    HOST_PREPROCESS_AVAILABLE = True
+except Exception:
+    HOST_PREPROCESS_AVAILABLE = False
+
+# Optional numba (JIT letterbox kernel for CPU preprocessing)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
+
+# Optional libjpeg-turbo encoder (pip install PyTurboJPEG); falls back to Pillow
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _TJ = TurboJPEG()
+except Exception:
+    _TJ = None
 
 # ============= Configuration =============
 BASE_DIR = Path(__file__).resolve().parent
@@ -39,9 +70,20 @@ STATIC_RESULTS.mkdir(parents=True, exist_ok=True)
 # Use raw string to avoid escape issues on Windows.
 DATASET_DIR = Path(r"D:\Dhruhi Nuv\College\Tivaan_Vision\DroneVehiclesDatasetYOLO")
 
+_DATASET_ROOT = DATASET_DIR.resolve()  # resolved once; used for path containment checks
+
+DATASET_SPLITS = ("train", "val", "test")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+DATASET_LIST_CAP = 200  # max images per split returned by /api/dataset_images (you can change)
+_DATASET_INDEX = None  # built lazily by dataset_index()
+
 # Model weights default locations (we try known paths)
 DEFAULT_WEIGHTS = BASE_DIR / "results" / "tivaan_yolov8_train" / "weights" / "best.pt"
 FALLBACK_WEIGHTS = BASE_DIR / "yolov8n.pt"
+# Optional TensorRT FP16 engine built next to best.pt by models/export_model.py
+DEFAULT_ENGINE = DEFAULT_WEIGHTS.with_suffix(".engine")
+# Optional INT8 ONNX model for CPU-only hosts, built by models/quantize_onnx.py (runs on ONNX Runtime)
+DEFAULT_INT8_ONNX = DEFAULT_WEIGHTS.with_name("best_int8.onnx")
 
 # ============= App init =============
 app = Flask(__name__, static_folder=str(STATIC_DIR), template_folder=str(BASE_DIR / "templates"))
@@ -52,22 +94,28 @@ MODEL = None
 MODEL_LOADED = False
 MODEL_ERR = None
 MODEL_PATH = None
+# Inference device: CUDA index 0 with FP16 when a GPU is present, else CPU/FP32
+DEVICE = "cpu"
+HALF = False
+IMGSZ = 640
+CONF = 0.25
 
 def try_load_model():
-    global MODEL, MODEL_LOADED, MODEL_ERR, MODEL_PATH
+    global MODEL, MODEL_LOADED, MODEL_ERR, MODEL_PATH, DEVICE, HALF
     if not ULTRALYTICS_AVAILABLE:
         MODEL_ERR = "ultralytics not installed in this venv."
         MODEL_LOADED = False
         print("[backend] ultralytics not installed.")
         return
 
-    # pick the best candidate
+    import torch  # installed with ultralytics
+    DEVICE = 0 if torch.cuda.is_available() else "cpu"
+    HALF = DEVICE != "cpu"
+
+    # pick the best candidate; a TensorRT engine (GPU) or INT8 ONNX model (CPU) beats the eager .pt graph
     candidates = [DEFAULT_WEIGHTS, FALLBACK_WEIGHTS]
-    found = None
-    for c in candidates:
-        if c.exists():
-            found = c
-            break
+    candidates.insert(0, DEFAULT_ENGINE if DEVICE != "cpu" else DEFAULT_INT8_ONNX)
+    found = [c for c in candidates if c.exists()]
 
     if not found:
         MODEL_ERR = f"No model weights found. Checked: {candidates}"
@@ -75,18 +123,24 @@ def try_load_model():
         print("[backend] model weights not found. Expected default at:", DEFAULT_WEIGHTS)
         return
 
-    try:
-        print(f"[backend] Loading model from: {found}")
-        MODEL = YOLO(str(found))
-        MODEL_LOADED = True
-        MODEL_ERR = None
-        MODEL_PATH = str(found)
-        print("[backend] Model loaded successfully.")
-    except Exception as e:
-        MODEL = None
-        MODEL_LOADED = False
-        MODEL_ERR = str(e) + "\n" + traceback.format_exc()
-        print("[backend] Failed to load model:", MODEL_ERR)
+    # fall through to the next candidate if one fails (e.g. TensorRT missing for a .engine)
+    for c in found:
+        try:
+            print(f"[backend] Loading model from: {c}")
+            MODEL = YOLO(str(c), task="detect")
+            # warm up once so the first request doesn't pay weight transfer / cuDNN autotune cost
+            dummy = np.zeros((IMGSZ, IMGSZ, 3), dtype=np.uint8)
+            MODEL.predict(dummy, imgsz=IMGSZ, conf=CONF, device=DEVICE, half=HALF, verbose=False)
+            MODEL_LOADED = True
+            MODEL_ERR = None
+            MODEL_PATH = str(c)
+            print(f"[backend] Model loaded successfully from {c.name} (device={DEVICE}, half={HALF}).")
+            return
+        except Exception as e:
+            MODEL = None
+            MODEL_LOADED = False
+            MODEL_ERR = str(e) + "\n" + traceback.format_exc()
+            print(f"[backend] Failed to load model from {c.name}, trying the next candidate:", MODEL_ERR)
 
 # Try load at startup
 try_load_model()
@@ -100,22 +154,463 @@ def safe_dataset_image_path(rel_path: str):
     if not rel_path:
         return None
     # decode URL encoded
-    rel = unquote(rel_path)
-    candidate = (DATASET_DIR / rel).resolve()
+    candidate = (_DATASET_ROOT / unquote(rel_path)).resolve()
+    if candidate != _DATASET_ROOT and candidate.is_relative_to(_DATASET_ROOT):
+        return candidate
+    return None
+
+def run_model(source):
+    """
+    Run MODEL on source (path, ndarray or list of them) on the configured DEVICE.
+    Falls back to MODEL.predict for older ultralytics call signatures.
+    """
+    kwargs = dict(imgsz=IMGSZ, conf=CONF, device=DEVICE, half=HALF, verbose=False)
     try:
-        if DATASET_DIR.resolve() in candidate.parents or DATASET_DIR.resolve() == candidate.parent:
-            return candidate
+        return MODEL(source, **kwargs)
     except Exception:
-        return None
-    return None
+        return MODEL.predict(source, **kwargs)
+
+def decode_upload(f):
+    """
+    Decode an uploaded FileStorage straight from its stream into a BGR ndarray
+    (the channel order ultralytics expects for numpy input). Nothing touches disk.
+    EXIF orientation is applied, as cv2.imread does for dataset images.
+    """
+    with Image.open(f.stream) as im:
+        rgb = np.asarray(ImageOps.exif_transpose(im).convert("RGB"))
+    return np.ascontiguousarray(rgb[..., ::-1])
+
+def read_image(path: Path):
+    """Decode an image file into a BGR ndarray; raises ValueError if it is not a readable image."""
+    img = cv2.imread(str(path))
+    if img is None:
+        raise ValueError(f"could not read image: {path}")
+    return img
+
+def save_jpeg(arr, out_path: Path, quality=90):
+    """
+    Encode an HxWx3 uint8 BGR array (ultralytics/OpenCV order) to JPEG, using libjpeg-turbo when available.
+    The bytes go to a .tmp file that is renamed onto out_path, so out_path is either absent or complete.
+    """
+    tmp_path = out_path.with_suffix(".tmp")
+    try:
+        if _TJ is not None:
+            tmp_path.write_bytes(_TJ.encode(np.ascontiguousarray(arr), quality=quality, pixel_format=TJPF_BGR))
+        else:
+            Image.fromarray(np.ascontiguousarray(arr[..., ::-1])).save(tmp_path, format="JPEG", quality=quality)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def result_boxes(r):
+    """Read the xyxy boxes of one Results object off the device once, as an (N,4) int array."""
+    boxes = getattr(r, "boxes", None)
+    if boxes is None:
+        return np.empty((0, 4), dtype=int)
+    return boxes.xyxy.cpu().numpy().astype(int).reshape(-1, 4)
+
+def draw_boxes(img, xyxy, color=(0, 255, 0), thickness=2):
+    """Draw plain rectangles on img (BGR, modified in place when writeable) and return it."""
+    if not img.flags.writeable:
+        img = img.copy()
+    for x1, y1, x2, y2 in xyxy.tolist():
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, thickness)
+    return img
+
+def risk_for_count(vehicle_count):
+    # heuristic risk
+    return "low" if vehicle_count < 15 else "medium" if vehicle_count < 40 else "high"
+
+# time_ns() only ticks every ~15.6 ms on Windows and batched requests finish together,
+# so the pid (gunicorn workers) plus a per-process counter keep annotated file names unique
+_OUT_SEQ = itertools.count()
+
+def _log_save_error(fut):
+    if fut.exception() is not None:
+        print("[backend] annotated save failed:", fut.exception())
+
+def detection_payload(r, out_prefix, wait=False, annotate=True):
+    """
+    Turn one ultralytics Results object into the JSON payload returned by the detect endpoints:
+    vehicle count, heuristic risk level and the URL of the annotated image.
+    The JPEG is written on _IO_POOL; the URL is returned right away unless wait=True
+    (until the write lands it 404s, never serves a partial file - see save_jpeg).
+    With annotate=False (count-only callers) plotting/saving is skipped and output_image is None.
+    """
+    vehicle_count = 0
+    out_url = None
+    try:
+        # one device->host read of the boxes feeds both the count and the drawing
+        xyxy = result_boxes(r)
+        vehicle_count = int(len(xyxy))
+
+        if not annotate:
+            return {"vehicle_count": vehicle_count, "risk_level": risk_for_count(vehicle_count), "output_image": None}
+
+        # annotate: plain rectangles on the original frame (cheaper than r.plot()'s labels)
+        try:
+            arr = draw_boxes(r.orig_img, xyxy)
+            out_name = f"{out_prefix}{time.time_ns()}_{os.getpid()}_{next(_OUT_SEQ)}.jpg"
+            fut = _IO_POOL.submit(save_jpeg, arr, STATIC_RESULTS / out_name)
+            if wait:
+                fut.result()
+            else:
+                fut.add_done_callback(_log_save_error)
+            out_url = "/static/results/" + out_name
+        except Exception as e:
+            print("[backend] annotated save failed:", e)
+    except Exception as e:
+        print("[backend] result parsing error:", e)
+
+    if out_url is None:
+        out_url = latest_annotated_url()
+    return {"vehicle_count": vehicle_count, "risk_level": risk_for_count(vehicle_count), "output_image": out_url}
+
+def payload_options():
+    """detection_payload() flags from the query string: ?wait=1 (block on the write), ?annotate=0 (count only)."""
+    return {"wait": request.args.get("wait") == "1", "annotate": request.args.get("annotate", "1") != "0"}
+
+THUMB_MIN_PX = 16
+THUMB_MAX_PX = 2048
+
+@lru_cache(maxsize=256)
+def thumbnail_bytes(path_str: str, width: int, mtime_ns: int):
+    """
+    JPEG bytes of path_str scaled to fit width x width. draft() lets libjpeg decode at
+    1/2, 1/4 or 1/8 scale instead of full resolution. mtime_ns is part of the cache key
+    so an edited image isn't served stale.
+    """
+    with Image.open(path_str) as im:
+        im.draft("RGB", (width, width))
+        im = im.convert("RGB")
+    im.thumbnail((width, width))
+    buf = BytesIO()
+    im.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+def _split_mtimes():
+    mtimes = {}
+    for split in DATASET_SPLITS:
+        try:
+            mtimes[split] = os.stat(DATASET_DIR / split / "images").st_mtime_ns
+        except OSError:
+            mtimes[split] = None
+    return mtimes
+
+def _scan_images(root: str):
+    """Recursively collect image file paths under root using os.scandir (no per-entry Path objects)."""
+    found = []
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTS:
+                        found.append(entry.path)
+        except OSError:
+            continue
+    return found
+
+def _build_index():
+    """
+    Walk every split once and keep the first DATASET_LIST_CAP sorted relative paths,
+    e.g. {"val": ["val/images/00570.jpg", ...], ...}.
+    """
+    mtimes = _split_mtimes()
+    index = {}
+    for split in DATASET_SPLITS:
+        if mtimes[split] is None:
+            index[split] = []
+            continue
+        root = str(DATASET_DIR)
+        rels = sorted(os.path.relpath(p, root).replace("\\","/") for p in _scan_images(os.path.join(root, split, "images")))
+        index[split] = rels[:DATASET_LIST_CAP]
+    return {"mtimes": mtimes, "index": index}
+
+def dataset_index():
+    """Cached per-split image list; rebuilt only when a split's images/ directory mtime changes."""
+    global _DATASET_INDEX
+    cached = _DATASET_INDEX
+    if cached is None or cached["mtimes"] != _split_mtimes():
+        cached = _build_index()
+        _DATASET_INDEX = cached
+    return cached["index"]
+
+_LATEST_CACHE = {"mtime": None, "url": None, "path": None}
+# a directory mtime this close to the scan may not reflect every change yet (coarse timestamps,
+# and save_jpeg's .tmp-then-rename touches the directory twice), so such scans aren't trusted
+LATEST_RACY_NS = 2_000_000_000
 
 def latest_annotated_url():
-    files = sorted(glob(str(STATIC_RESULTS / "annotated_*.jpg")), key=os.path.getmtime, reverse=True)
-    if not files:
+    """URL of the newest annotated_*.jpg; the glob is only re-run when STATIC_RESULTS' mtime changes."""
+    global _LATEST_CACHE
+    try:
+        dir_mtime = os.stat(STATIC_RESULTS).st_mtime_ns
+    except OSError:
         return None
-    return "/static/results/" + Path(files[0]).name
+    cached = _LATEST_CACHE
+    if cached["mtime"] == dir_mtime and (cached["path"] is None or os.path.exists(cached["path"])):
+        return cached["url"]
+    scan_ns = time.time_ns()
+    files = []
+    for f in glob(str(STATIC_RESULTS / "annotated_*.jpg")):
+        try:
+            files.append((os.path.getmtime(f), f))
+        except OSError:
+            continue  # removed since the glob
+    newest = max(files)[1] if files else None
+    url = "/static/results/" + Path(newest).name if newest else None
+    # replace the dict in one assignment so readers never see a mismatched mtime/url pair;
+    # a racy scan is cached with no mtime, so the next call scans again
+    trusted = scan_ns - dir_mtime > LATEST_RACY_NS
+    _LATEST_CACHE = {"mtime": dir_mtime if trusted else None, "url": url, "path": newest}
+    return url
+
+# ============= Micro-batching =============
+# Concurrent detect requests are coalesced into a single MODEL call so the GPU sees
+# one batch instead of many tiny forward passes. Batches are capped at MAX_BATCH
+# (larger batches stop paying off and start costing memory).
+MAX_BATCH = 16
+DETECT_BATCH_MAX_FILES = 4 * MAX_BATCH  # upload cap for /api/detect_batch
+BATCH_WAIT_S = 0.010  # how long the worker waits for more requests before running a partial batch
+
+_BATCH_QUEUE = queue.Queue()
+_BATCH_THREAD = None
+_BATCH_PID = None  # process that started _BATCH_THREAD (threads don't survive a fork)
+_BATCH_LOCK = threading.Lock()
+
+# The batch worker can letterbox each batch itself into one reusable buffer and hand the
+# model a ready NCHW tensor, instead of ultralytics building fresh arrays per call:
+#  - on CUDA the buffer is page-locked uint8 and goes to the GPU in one non-blocking DMA,
+#    where it is scaled to [0, 1] (and FP16);
+#  - on CPU it is a float32 buffer filled by a Numba kernel that fuses resize, pad,
+#    BGR->RGB, HWC->CHW and /255 into one pass (only used when numba is installed).
+# Like ultralytics' own preprocessing, a batch of same-shape frames on a .pt or dynamic model
+# is letterboxed to the smallest stride-aligned rectangle (e.g. 384x640 for 16:9) instead of
+# the full square, so the forward pass doesn't pay for the padding.
+# The buffers are flat and viewed as (n, 3, H, W) for each batch's shape.
+_HOST_BUF = None     # torch uint8 [MAX_BATCH * 3 * IMGSZ * IMGSZ], pinned; allocated on first use
+_HOST_BUF_NP = None  # numpy view of _HOST_BUF
+_CPU_BUF = None      # numpy float32 [MAX_BATCH * 3 * IMGSZ * IMGSZ]; allocated on first use
+
+def use_host_preprocess():
+    return HOST_PREPROCESS_AVAILABLE and (DEVICE != "cpu" or NUMBA_AVAILABLE)
+
+def _host_buffer():
+    global _HOST_BUF, _HOST_BUF_NP
+    if _HOST_BUF is None:
+        _HOST_BUF = torch.empty(MAX_BATCH * 3 * IMGSZ * IMGSZ, dtype=torch.uint8, pin_memory=True)
+        _HOST_BUF_NP = _HOST_BUF.numpy()
+    return _HOST_BUF, _HOST_BUF_NP
+
+def _cpu_buffer():
+    global _CPU_BUF
+    if _CPU_BUF is None:
+        _CPU_BUF = np.empty(MAX_BATCH * 3 * IMGSZ * IMGSZ, dtype=np.float32)
+    return _CPU_BUF
+
+def letterbox_shape(imgs, backend):
+    """
+    (H, W) the batch is letterboxed to: IMGSZ x IMGSZ, or for same-shape frames on a .pt or
+    dynamic backend the resized frame padded only up to a multiple of the model stride
+    (ultralytics' LetterBox(auto=True)).
+    """
+    shapes = {img.shape[:2] for img in imgs}
+    if len(shapes) != 1 or not (backend.pt or getattr(backend, "dynamic", False)):
+        return IMGSZ, IMGSZ
+    h, w = shapes.pop()
+    r = min(IMGSZ / h, IMGSZ / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    stride = int(backend.stride)
+    return nh + (IMGSZ - nh) % stride, nw + (IMGSZ - nw) % stride
+
+def _read_bgr(source):
+    return source if isinstance(source, np.ndarray) else read_image(source)
+
+def letterbox_into(img, out):
+    """
+    Letterbox img (HxWx3 BGR uint8) into out (3 x H x W, RGB, H and W <= IMGSZ): resize to fit
+    IMGSZ keeping aspect ratio, pad with 114 to out's size, and scale to [0, 1] if out is float.
+    Same geometry as ultralytics' LetterBox, so ops.scale_boxes() inverts it.
+    """
+    if NUMBA_AVAILABLE:
+        _letterbox_kernel(img, out, out.dtype != np.uint8, IMGSZ)
+        return
+    h, w = img.shape[:2]
+    oh, ow = out.shape[1:]
+    r = min(IMGSZ / h, IMGSZ / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    top, left = int(round((oh - nh) / 2 - 0.1)), int(round((ow - nw) / 2 - 0.1))
+    canvas = np.full((oh, ow, 3), 114, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = img if (nw, nh) == (w, h) else cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    chw = canvas[..., ::-1].transpose(2, 0, 1)
+    if out.dtype == np.uint8:
+        out[...] = chw
+    else:
+        np.multiply(chw, 1.0 / 255.0, out=out, casting="unsafe")
+
+def _letterbox_kernel(img, out, normalize, size):
+    # Bilinear (half-pixel centers, like cv2.INTER_LINEAR) resize to fit size x size + 114 pad
+    # up to out's H x W, written straight into the CHW RGB output.
+    h, w = img.shape[0], img.shape[1]
+    oh, ow = out.shape[1], out.shape[2]
+    r = min(size / h, size / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    top, left = int(round((oh - nh) / 2 - 0.1)), int(round((ow - nw) / 2 - 0.1))
+    scale = 1.0 / 255.0 if normalize else 1.0
+    bias = 0.0 if normalize else 0.5  # round-to-nearest when storing into uint8
+    pad = 114.0 * scale
+    sx, sy = w / nw, h / nh
+    for y in range(oh):
+        iy = y - top
+        if iy < 0 or iy >= nh:
+            for c in range(3):
+                for x in range(ow):
+                    out[c, y, x] = pad
+            continue
+        fy = max((iy + 0.5) * sy - 0.5, 0.0)
+        y0 = int(fy)
+        y1 = min(y0 + 1, h - 1)
+        wy = fy - y0
+        for x in range(ow):
+            ix = x - left
+            if ix < 0 or ix >= nw:
+                for c in range(3):
+                    out[c, y, x] = pad
+                continue
+            fx = max((ix + 0.5) * sx - 0.5, 0.0)
+            x0 = int(fx)
+            x1 = min(x0 + 1, w - 1)
+            wx = fx - x0
+            for c in range(3):
+                src = 2 - c  # BGR -> RGB
+                top_v = img[y0, x0, src] * (1.0 - wx) + img[y0, x1, src] * wx
+                bot_v = img[y1, x0, src] * (1.0 - wx) + img[y1, x1, src] * wx
+                out[c, y, x] = (top_v * (1.0 - wy) + bot_v * wy) * scale + bias
+
+if NUMBA_AVAILABLE:
+    _letterbox_kernel = njit(cache=True, fastmath=True)(_letterbox_kernel)
+    # compile (or load from cache) both buffer flavours now, not on the first request
+    _letterbox_kernel(np.zeros((8, 8, 3), np.uint8), np.empty((3, IMGSZ, IMGSZ), np.uint8), False, IMGSZ)
+    _letterbox_kernel(np.zeros((8, 8, 3), np.uint8), np.empty((3, IMGSZ, IMGSZ), np.float32), True, IMGSZ)
+
+def _predictor():
+    """MODEL's ultralytics predictor (created by the warm-up in try_load_model, or here on first use)."""
+    if getattr(MODEL, "predictor", None) is None:
+        run_model(np.zeros((IMGSZ, IMGSZ, 3), dtype=np.uint8))
+    return MODEL.predictor
+
+def run_model_preprocessed(sources):
+    """
+    run_model() with our own preprocessing (see above). The batch goes straight into the
+    predictor's AutoBackend and through NMS here: handing the tensor to MODEL(...) would make
+    ultralytics copy the whole input batch back to the host for its Results. Boxes are mapped
+    back onto the original frames so callers get ordinary Results objects.
+    """
+    imgs = [_read_bgr(s) for s in sources]
+    n = len(imgs)
+    predictor = _predictor()
+    args = predictor.args
+    shape = letterbox_shape(imgs, predictor.model)
+    size = n * 3 * shape[0] * shape[1]
+    if DEVICE != "cpu":
+        buf, buf_np = _host_buffer()
+        for img, out in zip(imgs, buf_np[:size].reshape(n, 3, *shape)):
+            letterbox_into(img, out)
+        batch = buf[:size].view(n, 3, *shape).to(f"cuda:{DEVICE}", non_blocking=True)
+        # dtype must match the backend's input binding (a TensorRT engine may be FP32 even with HALF)
+        batch = (batch.half() if predictor.model.fp16 else batch.float()).div_(255.0)
+    else:
+        buf = _cpu_buffer()[:size].reshape(n, 3, *shape)
+        for img, out in zip(imgs, buf):
+            letterbox_into(img, out)
+        batch = torch.from_numpy(buf)
+
+    with torch.inference_mode():
+        preds = predictor.model(batch)
+        dets = ops.non_max_suppression(preds, args.conf, args.iou, classes=args.classes,
+                                       agnostic=args.agnostic_nms, max_det=args.max_det)
+    out = []
+    for i, (det, img) in enumerate(zip(dets, imgs)):
+        det[:, :4] = ops.scale_boxes(shape, det[:, :4], img.shape)
+        out.append(Results(img, path=f"image{i}.jpg", names=predictor.model.names, boxes=det))
+    return out
+
+def _detect_batch(sources):
+    return run_model_preprocessed(sources) if use_host_preprocess() else run_model(sources)
+
+def _batch_worker():
+    while True:
+        items = [_BATCH_QUEUE.get()]
+        deadline = time.monotonic() + BATCH_WAIT_S
+        while len(items) < MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(_BATCH_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        sources = [source for source, _ in items]
+        try:
+            results = _detect_batch(sources)
+        except Exception:
+            # one bad item must not fail the requests batched with it: retry them one by one
+            for source, fut in items:
+                try:
+                    fut.set_result(_detect_batch([source])[0])
+                except Exception as e:
+                    fut.set_exception(e)
+            continue
+        for (_, fut), r in zip(items, results):
+            fut.set_result(r)
+
+def submit_detection(source):
+    """
+    Queue one decoded image (HxWx3 BGR ndarray) for batched inference. Returns a Future resolving
+    to its Results. Decode in the request thread first (decode_upload / read_image) so an
+    unreadable file is rejected there instead of inside a shared batch.
+    """
+    global _BATCH_THREAD, _BATCH_QUEUE, _BATCH_PID
+    with _BATCH_LOCK:
+        # start lazily, and again in a forked gunicorn worker that inherited a dead thread
+        if _BATCH_THREAD is None or _BATCH_PID != os.getpid():
+            _BATCH_QUEUE = queue.Queue()
+            _BATCH_PID = os.getpid()
+            _BATCH_THREAD = threading.Thread(target=_batch_worker, name="tv-batcher", daemon=True)
+            _BATCH_THREAD.start()
+    fut = Future()
+    _BATCH_QUEUE.put((source, fut))
+    return fut
+
+def detect_images(sources):
+    """Run detection on a list of images through the micro-batcher, preserving order."""
+    futures = [submit_detection(s) for s in sources]
+    return [fut.result() for fut in futures]
+
+# ============= Background I/O =============
+# Annotated JPEGs are encoded + written off the request thread; pass ?wait=1 to a
+# detect endpoint to block until the file is on disk.
+_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tv-io")
 
 # ============= Routes =============
+DATASET_CACHE_CONTROL = "public, max-age=3600"
+# annotated_<timestamp>.jpg files are written once and never change; save_jpeg only renames
+# a finished file onto that name, so any 200 for it is the complete image. The in-progress
+# annotated_<timestamp>.tmp never gets this header.
+ANNOTATED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@app.after_request
+def add_cache_headers(resp):
+    path = request.path
+    if (path.startswith("/static/results/annotated_") and path.endswith(".jpg")
+            and resp.status_code in (200, 304)):
+        resp.headers["Cache-Control"] = ANNOTATED_CACHE_CONTROL
+    return resp
 
 @app.route("/")
 def home():
@@ -155,33 +650,46 @@ def api_dataset_images():
       "test": [...]
     }
     Note: For large datasets we return first N images only to avoid huge payloads.
+    The listing is built once and cached; see dataset_index().
     """
-    out = {}
-    cap = 200  # max images per split to return (you can change)
-    for split in ("train", "val", "test"):
-        images_dir = DATASET_DIR / split / "images"
-        if not images_dir.exists():
-            out[split] = []
-            continue
-        images = sorted([p for p in images_dir.glob("**/*") if p.suffix.lower() in [".jpg",".jpeg",".png"]])
-        # convert to relative paths relative to DATASET_DIR: e.g., "val/images/00570.jpg"
-        rels = [str(p.relative_to(DATASET_DIR)).replace("\\","/") for p in images[:cap]]
-        out[split] = rels
-    return jsonify(out)
+    return jsonify(dataset_index())
+
+# POST /api/dataset_images/refresh - drop the cached index (e.g. after adding images in a subfolder)
+@app.route("/api/dataset_images/refresh", methods=["POST"])
+def api_dataset_images_refresh():
+    global _DATASET_INDEX
+    _DATASET_INDEX = None
+    return jsonify(dataset_index())
 
 # Serve a dataset image by relative path (safe check)
 @app.route("/dataset_image")
 def dataset_image():
     """
-    Query param: ?img=<relative-path>
-    Example: /dataset_image?img=val/images/00570_jpg.rf.1ccac6fe20948b2e9d2783b8a751f138.jpg
+    Query param: ?img=<relative-path>[&w=<max-px>]
+    Example: /dataset_image?img=val/images/00570_jpg.rf.1ccac6fe20948b2e9d2783b8a751f138.jpg&w=320
+    With w, a downscaled JPEG preview (longest side <= w) is returned instead of the original.
     """
     rel = request.args.get("img", "")
     safe = safe_dataset_image_path(rel)
     if not safe or not safe.exists():
         return jsonify({"error":"image not found or invalid path", "path": rel}), 404
-    # send file
-    return send_file(str(safe), mimetype="image/jpeg")
+
+    width = request.args.get("w", type=int)
+    if width:
+        width = min(max(width, THUMB_MIN_PX), THUMB_MAX_PX)
+        try:
+            st = safe.stat()
+            data = thumbnail_bytes(str(safe), width, st.st_mtime_ns)
+            resp = send_file(BytesIO(data), mimetype="image/jpeg", conditional=True,
+                             etag=f"{st.st_mtime_ns:x}-{st.st_size:x}-w{width}", last_modified=st.st_mtime)
+            resp.headers["Cache-Control"] = DATASET_CACHE_CONTROL
+            return resp
+        except Exception as e:
+            print("[backend] thumbnail failed, sending original:", e)
+    # send file (conditional: answers If-None-Match / If-Modified-Since with 304)
+    resp = send_file(str(safe), mimetype="image/jpeg", conditional=True, etag=True, last_modified=safe.stat().st_mtime)
+    resp.headers["Cache-Control"] = DATASET_CACHE_CONTROL
+    return resp
 
 # POST /api/detect - accept file upload ('file' field) and run model
 @app.route("/api/detect", methods=["POST"])
@@ -198,68 +706,53 @@ def api_detect():
     if f.filename == "":
         return jsonify({"error":"empty filename"}), 400
 
-    # save temporarily
-    tmp_dir = BASE_DIR / "tmp_uploads"
-    tmp_dir.mkdir(exist_ok=True)
-    ts = int(time.time() * 1000)
-    suffix = Path(f.filename).suffix or ".jpg"
-    tmp_path = tmp_dir / f"upload_{ts}{suffix}"
+    # decode in memory
     try:
-        f.save(tmp_path)
+        img = decode_upload(f)
     except Exception as e:
-        return jsonify({"error":"failed saving uploaded file", "details": str(e)}), 500
+        return jsonify({"error":"failed decoding uploaded file", "details": str(e)}), 400
 
-    # run model
+    # run model (through the micro-batcher so concurrent uploads share one forward pass)
     try:
-        results = MODEL(str(tmp_path), imgsz=640, conf=0.25, device="cpu")
-    except Exception as e:
-        # try alternative call
-        try:
-            results = MODEL.predict(str(tmp_path), imgsz=640, conf=0.25, device="cpu")
-        except Exception as ex:
-            tb = traceback.format_exc()
-            return jsonify({"error":"model inference error", "details": str(ex), "trace": tb}), 500
+        results = detect_images([img])
+    except Exception as ex:
+        tb = traceback.format_exc()
+        return jsonify({"error":"model inference error", "details": str(ex), "trace": tb}), 500
 
-    vehicle_count = 0
-    out_url = None
-    try:
-        if len(results) > 0:
-            r = results[0]
-            # robust count
-            try:
-                vehicle_count = int(len(r.boxes))
-            except Exception:
-                try:
-                    vehicle_count = int(r.boxes.data.shape[0])
-                except Exception:
-                    vehicle_count = 0
+    return jsonify(detection_payload(results[0], "annotated_", **payload_options()))
 
-            # annotate (plot)
-            try:
-                arr = r.plot()
-                img = Image.fromarray(arr)
-                out_name = f"annotated_{int(time.time()*1000)}.jpg"
-                out_path = STATIC_RESULTS / out_name
-                img.save(out_path, quality=90)
-                out_url = "/static/results/" + out_name
-            except Exception as e:
-                print("[backend] annotated save failed:", e)
-                out_url = latest_annotated_url()
-    except Exception as e:
-        print("[backend] result parsing error:", e)
+# POST /api/detect_batch - accept several uploads ('files' field) and run them as one batch
+@app.route("/api/detect_batch", methods=["POST"])
+def api_detect_batch():
+    if not ULTRALYTICS_AVAILABLE:
+        return jsonify({"error":"ultralytics not installed"}), 500
+    if not MODEL_LOADED:
+        return jsonify({"error":"model not loaded", "details": MODEL_ERR}), 500
 
-    # cleanup tmp file
-    try:
-        tmp_path.unlink(missing_ok=True)
-    except Exception:
-        pass
+    files = [f for f in request.files.getlist("files") if f.filename]
+    if not files:
+        return jsonify({"error":"no files uploaded. Use 'files' field"}), 400
+    if len(files) > DETECT_BATCH_MAX_FILES:
+        return jsonify({"error":f"too many files; send at most {DETECT_BATCH_MAX_FILES} per request"}), 413
 
-    if out_url is None:
-        out_url = latest_annotated_url()
+    try:
+        imgs = [decode_upload(f) for f in files]
+    except Exception as e:
+        return jsonify({"error":"failed decoding uploaded file", "details": str(e)}), 400
 
-    # heuristic risk
-    risk = "low" if vehicle_count < 15 else "medium" if vehicle_count < 40 else "high"
-    return jsonify({"vehicle_count": vehicle_count, "risk_level": risk, "output_image": out_url})
+    try:
+        results = detect_images(imgs)
+    except Exception as ex:
+        tb = traceback.format_exc()
+        return jsonify({"error":"model inference error", "details": str(ex), "trace": tb}), 500
+
+    opts = payload_options()
+    out = []
+    for i, r in enumerate(results):
+        payload = detection_payload(r, f"annotated_batch{i}_", **opts)
+        payload["filename"] = files[i].filename
+        out.append(payload)
+    return jsonify({"results": out})
 
 # GET /api/demo_detect?img=<rel_path> -> run detection on dataset image directly (no upload)
 @app.route("/api/demo_detect", methods=["GET"])
@@ -272,74 +765,57 @@ def api_demo_detect():
     rel = request.args.get("img", "")
     if not rel:
         # if no image provided, try a sample inside dataset: first val image found
-        imgs = []
+        index = dataset_index()
         for split in ("val","test","train"):
-            d = DATASET_DIR / split / "images"
-            if d.exists():
-                imgs = sorted([p for p in d.glob("*") if p.suffix.lower() in [".jpg",".jpeg",".png"]])
-                if imgs:
-                    rel = str(imgs[0].relative_to(DATASET_DIR)).replace("\\","/")
-                    break
+            if index[split]:
+                rel = index[split][0]
+                break
     safe = safe_dataset_image_path(rel)
     if not safe or not safe.exists():
         return jsonify({"error":"demo image not found", "requested": rel}), 404
 
     try:
-        results = MODEL(str(safe), imgsz=640, conf=0.25, device="cpu")
+        img = read_image(safe)
     except Exception as e:
-        try:
-            results = MODEL.predict(str(safe), imgsz=640, conf=0.25, device="cpu")
-        except Exception as ex:
-            tb = traceback.format_exc()
-            return jsonify({"error":"inference error", "details": str(ex), "trace": tb}), 500
+        return jsonify({"error":"failed decoding demo image", "details": str(e), "requested": rel}), 400
 
-    vehicle_count = 0
-    out_url = None
-    if len(results) > 0:
-        r = results[0]
-        try:
-            vehicle_count = int(len(r.boxes))
-        except Exception:
-            vehicle_count = 0
-        # create annotated image
-        try:
-            arr = r.plot()
-            img = Image.fromarray(arr)
-            out_name = f"annotated_demo_{int(time.time()*1000)}.jpg"
-            out_path = STATIC_RESULTS / out_name
-            img.save(out_path, quality=90)
-            out_url = "/static/results/" + out_name
-        except Exception as e:
-            print("[backend] demo annotated save failed:", e)
-            out_url = latest_annotated_url()
+    try:
+        results = detect_images([img])
+    except Exception as ex:
+        tb = traceback.format_exc()
+        return jsonify({"error":"inference error", "details": str(ex), "trace": tb}), 500
 
-    if out_url is None:
-        out_url = latest_annotated_url()
-    risk = "low" if vehicle_count < 15 else "medium" if vehicle_count < 40 else "high"
-    return jsonify({"vehicle_count": vehicle_count, "risk_level": risk, "output_image": out_url})
+    return jsonify(detection_payload(results[0], "annotated_demo_", **payload_options()))
 
 # IoT endpoint (same as earlier)
+def iot_reading(data):
+    """Alert level and recommended action for one sensor reading."""
+    dist = data.get("distance") if data else request.args.get("distance")
+    try:
+        d = float(dist) if dist is not None else 100.0
+    except Exception:
+        d = 100.0
+    if d < 0:
+        d = 100.0
+    if d < 20:
+        alert = "DANGER"
+        action = "EMERGENCY_STOP"
+    elif d < 50:
+        alert = "WARN"
+        action = "slow_down"
+    else:
+        alert = "SAFE"
+        action = "none"
+    return {"distance": int(d), "alert": alert, "recommended_action": action}
+
 @app.route("/api/iot", methods=["GET","POST"])
 def api_iot():
     try:
-        data = request.get_json(force=True, silent=True) or {}
-        dist = data.get("distance") if data else request.args.get("distance")
-        try:
-            d = float(dist) if dist is not None else 100.0
-        except Exception:
-            d = 100.0
-        if d < 0:
-            d = 100.0
-        if d < 20:
-            alert = "DANGER"
-            action = "EMERGENCY_STOP"
-        elif d < 50:
-            alert = "WARN"
-            action = "slow_down"
-        else:
-            alert = "SAFE"
-            action = "none"
-        return jsonify({"distance": int(d), "alert": alert, "recommended_action": action})
+        data = request.get_json(force=True, silent=True)
+        # simulators may post a batch of samples as a JSON array
+        if isinstance(data, list):
+            return jsonify([iot_reading(d if isinstance(d, dict) else {}) for d in data])
+        return jsonify(iot_reading(data or {}))
     except Exception as e:
         return jsonify({"error":"iot error", "details": str(e)}), 500
 
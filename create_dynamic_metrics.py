@@ -10,6 +10,8 @@ Behavior:
  - If latest annotated image mtime > last_detection timestamp (or timestamp missing),
    and ultralytics is available, re-run the model ON THAT IMAGE to produce fresh detections.
  - Writes static/results/metrics_detailed.json and static/results/metrics_summary_small.png
+   Detections are stored as parallel columns (bboxes / confs / classes / areas_px / centers);
+   pass --compat to also write the old list-of-dicts "detections" field.
 """
 
 import json
@@ -18,20 +20,21 @@ import argparse
 import math
 from pathlib import Path
 from datetime import datetime
-from statistics import mean, median, pstdev
+from functools import lru_cache
 
-# Optional image & plotting libs
+import numpy as np
+
+# Optional image lib (summary chart)
 try:
     from PIL import Image, ImageDraw, ImageFont
 except Exception:
     Image = None
 
+# Optional numba (JIT for the per-box numeric core); plain NumPy is used otherwise
 try:
-    import matplotlib
-    matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
+    from numba import njit
 except Exception:
-    plt = None
+    njit = None
 
 # Optional ultralytics (only used if available and we need to re-run model)
 try:
@@ -49,7 +52,18 @@ LAST_DET = STATIC_RESULTS / "last_detection.json"
 METRICS_DETAILED = STATIC_RESULTS / "metrics_detailed.json"
 SUMMARY_SMALL = STATIC_RESULTS / "metrics_summary_small.png"
 
+# Loaded models keyed by weights path, so repeated runs in one process reuse the weights
+_MODEL_CACHE = {}
+
 # ---------- Helpers ----------
+@lru_cache(maxsize=1)
+def summary_font():
+    """Label font for the summary chart, loaded once."""
+    try:
+        return ImageFont.truetype("arial.ttf", 13)
+    except Exception:
+        return ImageFont.load_default()
+
 def read_json_safe(p: Path):
     if not p.exists(): 
         return None
@@ -82,38 +96,91 @@ def ts_from_last_detection(d):
                 pass
     return None
 
-def bbox_area(b):
-    x1,y1,x2,y2 = b
-    w = max(0.0, x2-x1)
-    h = max(0.0, y2-y1)
-    return w*h
-
-def centroid(b):
-    x1,y1,x2,y2 = b
-    return [(x1+x2)/2.0, (y1+y2)/2.0]
-
 def safe_number(v, default=None):
     try:
         return float(v)
     except Exception:
         return default
 
+def _compute_box_stats(boxes):
+    """boxes: contiguous (N,4) float64 xyxy array -> (areas, cx, cy)."""
+    w = np.maximum(boxes[:, 2] - boxes[:, 0], 0.0)
+    h = np.maximum(boxes[:, 3] - boxes[:, 1], 0.0)
+    return w * h, (boxes[:, 0] + boxes[:, 2]) * 0.5, (boxes[:, 1] + boxes[:, 3]) * 0.5
+
+if njit is not None:
+    _compute_box_stats = njit(cache=True, fastmath=True)(_compute_box_stats)
+    # compile (or load from cache) now so the first real call isn't slow
+    _compute_box_stats(np.zeros((1, 4), dtype=np.float64))
+
+def detection_count(detections):
+    if isinstance(detections, dict):
+        return len(detections.get("bboxes") or [])
+    return len(detections or [])
+
+def _fit_column(values, n, default):
+    """values as a length-n float64 column: truncated if longer, padded with default if shorter."""
+    col = np.full(n, default, dtype=np.float64)
+    vals = np.asarray(values or [], dtype=np.float64).ravel()[:n]
+    col[:vals.size] = vals
+    return col
+
+def detections_to_array(detections):
+    """
+    Normalize detections into an (N,6) float64 array of [x1, y1, x2, y2, conf, cls].
+    Accepts the column form {"bboxes", "confs", "classes"} or the older list of
+    dicts / [x1,y1,x2,y2,conf,cls] lists.
+    """
+    if isinstance(detections, dict):
+        boxes = np.asarray(detections.get("bboxes") or [], dtype=np.float64).reshape(-1, 4)
+        n = boxes.shape[0]
+        # short or missing columns are padded with the defaults, extra entries dropped
+        return np.column_stack([boxes, _fit_column(detections.get("confs"), n, 0.0),
+                                _fit_column(detections.get("classes"), n, 0)])
+
+    rows = []
+    for d in detections or []:
+        bbox=None; conf=None; cls=0
+        if isinstance(d, dict):
+            bbox = d.get("bbox") or d.get("xyxy")
+            conf = safe_number(d.get("conf") or d.get("confidence") or d.get("score"), 0.0)
+            cls = int(d.get("cls", d.get("class",0)))
+        elif isinstance(d, (list,tuple)):
+            if len(d) >= 4:
+                bbox = list(map(float, d[:4]))
+            if len(d) >= 5:
+                conf = safe_number(d[4], 0.0)
+            if len(d) >= 6:
+                cls = int(d[5])
+        if bbox is None:
+            continue
+        rows.append([*map(float, bbox[:4]), conf if conf is not None else 0.0, cls])
+    return np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+
 # ---------- Model-run helper (defensive) ----------
+def get_model(weights_path=None):
+    """Return a cached YOLO instance for weights_path (loaded on first use)."""
+    key = str(weights_path) if weights_path else None
+    model = _MODEL_CACHE.get(key)
+    if model is None:
+        model = YOLO(key) if key else YOLO()
+        _MODEL_CACHE[key] = model
+    return model
+
 def run_model_on_image(image_path, weights_path=None):
     """
     Run YOLO on image_path if ultralytics is available.
-    Returns list of detections: dicts with bbox [x1,y1,x2,y2], conf, cls.
+    Returns detections as parallel columns: {"bboxes": [[x1,y1,x2,y2], ...], "confs": [...], "classes": [...]}.
     """
     if not ULTRALYTICS_AVAILABLE:
         print("ℹ️ ultralytics not available; skipping model run.")
         return None
     try:
-        model = YOLO(str(weights_path)) if weights_path else YOLO()
+        model = get_model(weights_path)
         results = model(str(image_path), imgsz=640, conf=0.25, device="cpu")
         if len(results) == 0:
-            return []
+            return {"bboxes": [], "confs": [], "classes": []}
         r = results[0]
-        detections = []
         # Try robust access to boxes
         try:
             # new-style API
@@ -128,67 +195,59 @@ def run_model_on_image(image_path, weights_path=None):
                 clss = data[:, 5].astype(int) if data.shape[1] > 5 else [0]*len(boxes)
             except Exception as ex:
                 print("⚠️ Unable to parse r.boxes:", ex)
-                return []
-        for i,b in enumerate(boxes):
-            x1,y1,x2,y2 = [float(x) for x in b]
-            conf = float(confs[i]) if i < len(confs) else 0.0
-            cls = int(clss[i]) if i < len(clss) else 0
-            detections.append({"bbox":[x1,y1,x2,y2], "conf": round(conf,4), "cls": int(cls)})
-        return detections
+                return {"bboxes": [], "confs": [], "classes": []}
+        return {
+            "bboxes": np.asarray(boxes, dtype=np.float64).reshape(-1, 4).tolist(),
+            "confs": np.round(np.asarray(confs, dtype=np.float64), 4).tolist(),
+            "classes": np.asarray(clss).astype(int).tolist(),
+        }
     except Exception as e:
         print("❌ Model run failed:", e)
         return None
 
 # ---------- Build metrics ----------
-def build_for_image(image_path: Path, last_detection: dict = None, model_weights=None):
+def build_for_image(image_path: Path, last_detection: dict = None, model_weights=None, compat=False):
     """
     Build detailed metrics for this image path.
     If last_detection is provided and includes detections, we'll prefer that
     (but if it is stale and model can run, we prefer re-running).
+    Detections are written as parallel columns ("bboxes", "confs", "classes", "areas_px",
+    "centers"); compat=True also writes the old list-of-dicts "detections".
     """
     # Try to get detections list from last_detection (if it points to this image)
     detections = None
     if isinstance(last_detection, dict):
-        # If last_detection references this image explicitly, and contains 'detections', use it.
+        # If last_detection references this image explicitly, use its detections (column form or legacy list).
         od = last_detection.get("output_image") or last_detection.get("image_name") or last_detection.get("image_path")
         if od:
             od_name = Path(od).name
-            if od_name == image_path.name and "detections" in last_detection and isinstance(last_detection["detections"], list):
-                detections = last_detection["detections"]
+            if od_name == image_path.name:
+                if isinstance(last_detection.get("bboxes"), list):
+                    detections = last_detection
+                elif isinstance(last_detection.get("detections"), list):
+                    detections = last_detection["detections"]
 
     # If no detections or detections are stale, try to run model on the image
-    if (not detections or len(detections)==0) and ULTRALYTICS_AVAILABLE:
+    if detection_count(detections) == 0 and ULTRALYTICS_AVAILABLE:
         print("ℹ️ Running model on image (fresh) ->", image_path)
         run_dets = run_model_on_image(image_path, weights_path=model_weights)
         if run_dets is not None:
             detections = run_dets
 
-    # Normalize detections
-    norm = []
-    for d in detections or []:
-        bbox=None; conf=None; cls=0
-        if isinstance(d, dict):
-            bbox = d.get("bbox") or d.get("xyxy")
-            conf = safe_number(d.get("conf") or d.get("confidence") or d.get("score"), 0.0)
-            cls = int(d.get("cls", d.get("class",0)))
-        elif isinstance(d, (list,tuple)):
-            if len(d) >= 4:
-                bbox = list(map(float, d[:4]))
-            if len(d) >= 5:
-                conf = safe_number(d[4], 0.0)
-            if len(d) >= 6:
-                cls = int(d[5])
-        if bbox is None:
-            continue
-        area = bbox_area(bbox)
-        cx, cy = centroid(bbox)
-        norm.append({
-            "bbox":[round(float(x),2) for x in bbox],
-            "conf": round(conf if conf is not None else 0.0,4),
-            "cls": int(cls),
-            "area_px": round(area,2),
-            "center":[round(cx,2), round(cy,2)]
-        })
+    arr = detections_to_array(detections)
+    boxes = np.ascontiguousarray(arr[:, :4])
+    areas, cx, cy = _compute_box_stats(boxes)
+    areas = np.round(areas, 2)
+    confs = np.round(arr[:, 4], 4)
+    centers = np.round(np.stack([cx, cy], axis=1), 2)
+    # parallel columns (SoA): each can be fed straight back into np.asarray by consumers
+    columns = {
+        "bboxes": np.round(boxes, 2).tolist(),
+        "confs": confs.tolist(),
+        "classes": arr[:, 5].astype(int).tolist(),
+        "areas_px": areas.tolist(),
+        "centers": centers.tolist(),
+    }
 
     vehicle_count = None
     if last_detection and isinstance(last_detection, dict):
@@ -203,17 +262,16 @@ def build_for_image(image_path: Path, last_detection: dict = None, model_weights
 
     if vehicle_count is None:
         # fallback to current detection length
-        vehicle_count = len(norm)
+        vehicle_count = int(arr.shape[0])
 
     # confidence stats
-    confs = [x["conf"] for x in norm if x.get("conf") is not None]
     conf_stats = {}
-    if confs:
-        conf_stats["mean_conf"] = round(mean(confs),4)
-        conf_stats["median_conf"] = round(median(confs),4)
-        conf_stats["std_conf"] = round(pstdev(confs),4) if len(confs) > 1 else 0.0
-        conf_stats["min_conf"] = round(min(confs),4)
-        conf_stats["max_conf"] = round(max(confs),4)
+    if confs.size:
+        conf_stats["mean_conf"] = round(float(confs.mean()),4)
+        conf_stats["median_conf"] = round(float(np.median(confs)),4)
+        conf_stats["std_conf"] = round(float(confs.std()),4) if confs.size > 1 else 0.0
+        conf_stats["min_conf"] = round(float(confs.min()),4)
+        conf_stats["max_conf"] = round(float(confs.max()),4)
     else:
         conf_stats.update({"mean_conf":None,"median_conf":None,"std_conf":None,"min_conf":None,"max_conf":None})
 
@@ -260,7 +318,7 @@ def build_for_image(image_path: Path, last_detection: dict = None, model_weights
             "relative": "/static/results/" + image_path.name if str(image_path).startswith(str(STATIC_RESULTS)) else str(image_path)
         },
         "vehicle_count": int(vehicle_count) if isinstance(vehicle_count,(int,float)) else vehicle_count,
-        "detections": norm,
+        **columns,
         "confidence_stats": conf_stats,
         "image_size": image_size,
         "density_per_100k_px": density,
@@ -273,6 +331,12 @@ def build_for_image(image_path: Path, last_detection: dict = None, model_weights
         "recommended_iot_action": recommended,
         "source_last_detection": last_detection if isinstance(last_detection, dict) else None
     }
+    if compat:
+        # legacy list-of-dicts layout for older readers
+        out["detections"] = [
+            {"bbox": b, "conf": c, "cls": k, "area_px": a, "center": ctr}
+            for b, c, k, a, ctr in zip(*(columns[k] for k in ("bboxes", "confs", "classes", "areas_px", "centers")))
+        ]
 
     # Save json
     try:
@@ -281,33 +345,28 @@ def build_for_image(image_path: Path, last_detection: dict = None, model_weights
     except Exception as e:
         print("❌ Failed to write metrics JSON:", e)
 
-    # Small visual summary
+    # Small visual summary (bar chart drawn directly with Pillow)
     try:
-        if plt:
+        if Image:
             vals = [out["estimated_metrics"].get(k) or 0.0 for k in ("precision","recall","mAP")]
             labels = ["Precision","Recall","mAP"]
-            plt.close("all")
-            fig, ax = plt.subplots(figsize=(4,2.2), dpi=120)
-            ax.bar(labels, vals, color=["#2777ff","#1f77b4","#2ca02c"])
-            ax.set_ylim(0,1)
-            ax.set_title("Est. Metrics")
-            for i,v in enumerate(vals):
-                ax.text(i, v+0.02, f"{v:.3f}" if v else "—", ha="center", fontsize=8)
-            plt.tight_layout()
-            fig.savefig(SUMMARY_SMALL, bbox_inches="tight", pad_inches=0.1)
-            plt.close(fig)
-            print("✅ Saved summary:", SUMMARY_SMALL.name)
-        elif Image:
+            colors = [(0x27,0x77,0xff), (0x1f,0x77,0xb4), (0x2c,0xa0,0x2c)]
             w,h = 640,200
             im = Image.new("RGB",(w,h),(18,24,33))
             draw = ImageDraw.Draw(im)
-            try:
-                font = ImageFont.load_default()
-            except Exception:
-                font = None
-            draw.text((12,12), f"Vehicles: {out['vehicle_count']}  Risk: {out['risk_level']}", fill=(255,255,255), font=font)
-            im.save(SUMMARY_SMALL)
-            print("✅ Saved small summary (Pillow)")
+            font = summary_font()
+            draw.text((12,8), f"Est. Metrics   Vehicles: {out['vehicle_count']}  Risk: {out['risk_level']}", fill=(255,255,255), font=font)
+            top, bottom = 48, h - 24
+            slot = w // len(vals)
+            bar_w = slot // 2
+            for i,(v,label,color) in enumerate(zip(vals, labels, colors)):
+                x0 = i*slot + (slot - bar_w)//2
+                y0 = bottom - int((bottom - top) * min(max(v, 0.0), 1.0))
+                draw.rectangle([(x0,y0),(x0+bar_w,bottom)], fill=color)
+                draw.text((x0, y0-16), f"{v:.3f}" if v else "-", fill=(230,230,230), font=font)
+                draw.text((x0, bottom+6), label, fill=(200,200,200), font=font)
+            im.save(SUMMARY_SMALL, optimize=False)
+            print("✅ Saved summary:", SUMMARY_SMALL.name)
     except Exception as e:
         print("⚠️ Failed to create summary image:", e)
 
@@ -318,6 +377,7 @@ def main():
     parser = argparse.ArgumentParser(description="Create detailed metrics for last detection / given image")
     parser.add_argument("--image", "-i", help="Absolute or relative image path to analyze (overrides last_detection)", default=None)
     parser.add_argument("--weights", "-w", help="Optional weights path for model run", default=None)
+    parser.add_argument("--compat", action="store_true", help="Also write the old list-of-dicts 'detections' field for legacy readers")
     args = parser.parse_args()
 
     last = read_json_safe(LAST_DET) if LAST_DET.exists() else None
@@ -364,7 +424,7 @@ def main():
         return
 
     # Build metrics
-    result = build_for_image(image_to_use, last_detection=last, model_weights=args.weights)
+    result = build_for_image(image_to_use, last_detection=last, model_weights=args.weights, compat=args.compat)
     if result:
         print("✅ Metrics created for:", image_to_use.name)
         print("-> metrics_detailed.json: /static/results/metrics_detailed.json")
@@ -11,6 +11,11 @@ import json
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 RESULTS_DIR = Path("static") / "results"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 METRICS_FILE = RESULTS_DIR / "metrics.json"
@@ -54,7 +59,10 @@ metrics = {
 
 # Save safely
 try:
-    METRICS_FILE.write_text(json.dumps(metrics, indent=2), encoding="utf8")
+    if orjson is not None:
+        METRICS_FILE.write_bytes(orjson.dumps(metrics, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        METRICS_FILE.write_text(json.dumps(metrics, indent=2), encoding="utf8")
     print(f"✅ Created placeholder metrics.json at {METRICS_FILE}")
     print("You can now open the Metrics page — it will show placeholders and allow downloads.")
 except Exception as e:
@@ -4,15 +4,18 @@ from pathlib import Path
 STATIC_RESULTS = Path("static") / "results"
 STATIC_RESULTS.mkdir(parents=True, exist_ok=True)
 
+try:
+    _FONT = ImageFont.truetype("arial.ttf", 32)
+except:
+    _FONT = ImageFont.load_default()
+
 def make_text_image(path, txt, size=(800,400), bgcolor=(30,30,30), fg=(220,220,220)):
     img = Image.new("RGB", size, bgcolor)
     d = ImageDraw.Draw(img)
-    try:
-        f = ImageFont.truetype("arial.ttf", 32)
-    except:
-        f = ImageFont.load_default()
-    w,h = d.textsize(txt, font=f)
-    d.text(((size[0]-w)/2,(size[1]-h)/2), txt, font=f, fill=fg)
+    f = _FONT
+    bbox = d.textbbox((0,0), txt, font=f)
+    w,h = bbox[2]-bbox[0], bbox[3]-bbox[1]
+    d.text(((size[0]-w)/2-bbox[0],(size[1]-h)/2-bbox[1]), txt, font=f, fill=fg)
     img.save(path)
 
 make_text_image(STATIC_RESULTS / "labels.jpg", "labels.jpg (placeholder)")
@@ -1,35 +1,78 @@
-import os, glob
+import os, glob, re
+from multiprocessing import Pool
+import numpy as np
 
 root = r"D:\Dhruhi Nuv\College\Tivaan_Vision\DroneVehiclesDatasetYOLO"
 count_fixed = 0
 count_deleted = 0
 
-for subset in ["train", "val", "test"]:
-    label_dir = os.path.join(root, subset, "labels")
-    for path in glob.glob(os.path.join(label_dir, "*.txt")):
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            lines = [l.strip() for l in f.readlines() if l.strip()]
+# every non-blank line has exactly 5 whitespace-separated tokens
+_LINE5 = r"[^\S\n]*(?:\S+[^\S\n]+){4}\S+[^\S\n]*|[^\S\n]*"
+_FIVE_PER_LINE = re.compile(rf"(?:(?:{_LINE5})\n)*(?:{_LINE5})")
+_ROW_FMT = "0 %.6f %.6f %.6f %.6f"
 
-        new_lines = []
-        for line in lines:
-            parts = line.split()
-            if len(parts) != 5:
-                continue
-            try:
-                cls, x, y, w, h = map(float, parts)
-                cls = 0.0  # force single class
-                if not (0 <= x <= 1 and 0 <= y <= 1 and 0 < w <= 1 and 0 < h <= 1):
-                    continue
-                new_lines.append(f"{int(cls)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}")
-            except Exception:
+
+def _fix_lines_slow(text):
+    """Per-line fallback for files with malformed rows or non-numeric tokens."""
+    new_lines = []
+    for line in text.split("\n"):
+        parts = line.split()
+        if len(parts) != 5:
+            continue
+        try:
+            cls, x, y, w, h = map(float, parts)
+            cls = 0.0  # force single class
+            if not (0 <= x <= 1 and 0 <= y <= 1 and 0 < w <= 1 and 0 < h <= 1):
                 continue
+            new_lines.append(f"{int(cls)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}")
+        except Exception:
+            continue
+    return new_lines
+
+
+def fix_lines(text):
+    """Return the valid, single-class label lines of one file."""
+    if _FIVE_PER_LINE.fullmatch(text):
+        try:
+            arr = np.asarray(text.split(), dtype=np.float64).reshape(-1, 5)
+        except ValueError:
+            return _fix_lines_slow(text)
+        valid = ((arr[:, 1:3] >= 0).all(1) & (arr[:, 1:3] <= 1).all(1)
+                 & (arr[:, 3:5] > 0).all(1) & (arr[:, 3:5] <= 1).all(1))
+        # class column is forced to 0 by the format string
+        return [_ROW_FMT % tuple(row) for row in arr[valid, 1:].tolist()]
+    return _fix_lines_slow(text)
+
 
+def _fix_one(path):
+    """Fix one label file in place. Returns (fixed, deleted) counts."""
+    # one descriptor for both the read and the rewrite
+    fd = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+    try:
+        data = os.read(fd, os.fstat(fd).st_size)
+        text = data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+        new_lines = fix_lines(text)
         if new_lines:
-            with open(path, "w") as f:
-                f.write("\n".join(new_lines))
-            count_fixed += 1
-        else:
-            os.remove(path)
-            count_deleted += 1
-
-print(f"✅ Labels fixed: {count_fixed}, Deleted: {count_deleted}")
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, "\n".join(new_lines).encode("ascii"))
+            return (1, 0)
+    finally:
+        os.close(fd)
+    # closed first: Windows can't delete an open file
+    os.remove(path)
+    return (0, 1)
+
+
+if __name__ == "__main__":
+    paths = []
+    for subset in ["train", "val", "test"]:
+        label_dir = os.path.join(root, subset, "labels")
+        paths.extend(glob.glob(os.path.join(label_dir, "*.txt")))
+
+    with Pool(os.cpu_count()) as pool:
+        for fixed, deleted in pool.imap_unordered(_fix_one, paths, chunksize=128):
+            count_fixed += fixed
+            count_deleted += deleted
+
+    print(f"✅ Labels fixed: {count_fixed}, Deleted: {count_deleted}")
@@ -0,0 +1,10 @@
+# models/_loader.py
+# Shared model loader for the scripts in models/ (import as: from _loader import load_model).
+# Ultralytics is imported lazily so scripts that only check paths start fast, and the
+# cache means back-to-back inference + evaluation in one process deserialize best.pt once.
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def load_model(path):
+    from ultralytics import YOLO
+    return YOLO(path)
@@ -1,11 +1,38 @@
 # models/export_model.py
-from ultralytics import YOLO
+# Exports best.pt to ONNX and, on an NVIDIA GPU with TensorRT, to a FP16 engine (best.engine).
+# Set TV_INT8=1 to also build an INT8 engine (best_int8.engine) calibrated on the data.yaml val set.
 import os
+import shutil
 
 weights = r"D:/Dhruhi Nuv/College/Tivaan_Vision/results/tivaan_yolov8_train/weights/best.pt"
-if not os.path.exists(weights):
-    raise FileNotFoundError("best.pt not found. Train first!")
+DATA_YAML = r"D:/Dhruhi Nuv/College/Tivaan_Vision/data.yaml"
 
-model = YOLO(weights)
-model.export(format="onnx")
-print("✅ Model exported as ONNX successfully!")
+def main():
+    if not os.path.exists(weights):
+        raise FileNotFoundError("best.pt not found. Train first!")
+
+    import torch
+    from _loader import load_model
+
+    model = load_model(weights)
+
+    # the engine exports write their own best.onnx as an intermediate, so they run before
+    # the plain ONNX export to leave that file as it was.
+    if torch.cuda.is_available():
+        if os.environ.get("TV_INT8", "0") == "1":
+            # both engines are named best.engine by ultralytics; move the INT8 one aside
+            int8_engine = model.export(format="engine", int8=True, data=DATA_YAML, simplify=True, imgsz=640,
+                                       device=0, dynamic=True, batch=16)
+            int8_path = shutil.move(int8_engine, os.path.join(os.path.dirname(int8_engine), "best_int8.engine"))
+            print("✅ INT8 TensorRT engine written to:", int8_path)
+        # dynamic=True + batch=16 so backend.py's micro-batches (up to MAX_BATCH=16) fit the engine
+        model.export(format="engine", half=True, simplify=True, imgsz=640, device=0, dynamic=True, batch=16)
+        print("✅ Model exported as TensorRT engine successfully!")
+    else:
+        print("❌ No CUDA GPU found, skipping TensorRT engine export.")
+
+    model.export(format="onnx")
+    print("✅ Model exported as ONNX successfully!")
+
+if __name__ == "__main__":
+    main()
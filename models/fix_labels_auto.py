@@ -1,5 +1,11 @@
 from pathlib import Path
 
+# Optional numba (compiles the per-line coordinate maths); plain Python is used otherwise
+try:
+    from numba import njit
+except Exception:
+    njit = None
+
 # Update this path for your dataset
 DATASET = Path("D:/Dhruhi Nuv/College/Tivaan_Vision/DroneVehiclesDatasetYOLO")
 
@@ -11,6 +17,18 @@ def normalize(x, y, w, h, img_w, img_h):
     h_norm = h / img_h
     return x_center, y_center, w_norm, h_norm
 
+def _convert(a, b, c, d, img_w, img_h):
+    """x, y, w, h -> normalized; values > 1 are treated as pixel coords."""
+    if a > 1 or b > 1 or c > 1 or d > 1:
+        return normalize(a, b, c, d, img_w, img_h)
+    return a, b, c, d
+
+if njit is not None:
+    normalize = njit(cache=True)(normalize)
+    _convert = njit(cache=True)(_convert)
+    # compile (or load from cache) now so the first real line isn't slow
+    _convert(0.5, 0.5, 0.1, 0.1, 1280, 720)
+
 def try_fix_line(parts, img_w=1280, img_h=720):
     """Try to fix a malformed label line."""
     # Case 1: if has 4 values → assume missing class, add class 0
@@ -22,10 +40,11 @@ def try_fix_line(parts, img_w=1280, img_h=720):
     # Case 3: if coordinates look like >1, assume they’re pixel coords
     try:
         cls, *coords = map(float, parts)
-        if any(c > 1 for c in coords):
-            # convert from absolute to normalized
-            x, y, w, h = coords
-            coords = normalize(x, y, w, h, img_w, img_h)
+        if len(coords) == 4:
+            coords = _convert(*coords, img_w, img_h)
+        elif any(c > 1 for c in coords):
+            # pixel coords can only be converted as x, y, w, h
+            return None
         return f"{int(cls)} " + " ".join(f"{c:.6f}" for c in coords)
     except:
         return None
@@ -15,13 +15,30 @@ What it does:
 - Produces a summary report file fix_report.txt in project root.
 """
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from PIL import Image
-import math
+import hashlib
+import json
+import os
+import re
+import numpy as np
+
+# Optional numba (compiles the per-row coordinate fixing); the same loop runs as plain Python otherwise
+try:
+    from numba import njit
+except Exception:
+    njit = None
 
 ROOT = Path("D:/Dhruhi Nuv/College/Tivaan_Vision")
 DATASET = ROOT / "DroneVehiclesDatasetYOLO"
 SUBSETS = ["train", "val", "test"]
 REPORT = ROOT / "fix_report.txt"
+CACHE = ROOT / "fix_report.cache.json"  # label path -> blake2b of its last known-good contents
+
+# canonical single-class label line; w/h of 0.000000 would be clamped, so they don't count
+_VALID_LINE = rb"0 0\.\d{6} 0\.\d{6} 0\.(?!0{6})\d{6} 0\.(?!0{6})\d{6}"
+_VALID_LABELS = re.compile(rb"(?:%s\r?\n)*%s\s*" % (_VALID_LINE, _VALID_LINE))
 
 def safe_float(x):
     try:
@@ -29,154 +46,260 @@ def safe_float(x):
     except:
         return None
 
-def convert_xywh_pixels_to_norm(x, y, w, h, iw, ih):
-    # x,y may be either top-left (x,y) with w,h OR center-based; if w and h are large values, we treat as pixels
-    cx = x + w/2.0
-    cy = y + h/2.0
-    return cx/iw, cy/ih, w/iw, h/ih
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3}
+
+def _jpeg_size(data):
+    # walk the marker segments up to the first SOFn frame header
+    i = 2
+    n = len(data)
+    while i + 9 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        seg_len = int.from_bytes(data[i + 2:i + 4], "big")
+        if marker in _JPEG_SOF:
+            h = int.from_bytes(data[i + 5:i + 7], "big")
+            w = int.from_bytes(data[i + 7:i + 9], "big")
+            return (w, h) if w and h else None
+        i += 2 + seg_len
+    return None
+
+@lru_cache(maxsize=None)
+def _img_size(path_str):
+    """(width, height) read from the file header; PIL only for other formats."""
+    ext = os.path.splitext(path_str)[1].lower()
+    if ext in (".jpg", ".jpeg", ".png"):
+        with open(path_str, "rb") as fh:
+            data = fh.read(65536)
+        size = None
+        if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+            size = (int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big"))
+        elif data[:2] == b"\xff\xd8":
+            size = _jpeg_size(data)
+        if size:
+            return size
+    with Image.open(path_str) as im:
+        return im.size
 
-def convert_xyxy_to_xywh_norm(x1, y1, x2, y2, iw, ih):
-    w = x2 - x1
-    h = y2 - y1
-    cx = x1 + w/2.0
-    cy = y1 + h/2.0
-    return cx/iw, cy/ih, w/iw, h/ih
+def _clamp(v):
+    # same as min(max(v, 1e-6), 1.0), NaN passes through
+    v = 1e-6 if 1e-6 > v else v
+    return 1.0 if 1.0 < v else v
 
-def fix_label_file(txt_path, img_path, nc=1):
+def _convert_batch(arr, iw, ih, out):
+    """Row loop over (N,4) raw coords writing normalized, clamped rows into out (iw=ih=0: size unknown)."""
+    for i in range(arr.shape[0]):
+        a, b, c, d = arr[i, 0], arr[i, 1], arr[i, 2], arr[i, 3]
+        if iw > 0 and ih > 0 and (a > 1 or b > 1 or c > 1 or d > 1):
+            if c > 1 and d > 1 and a <= iw and b <= ih:
+                cx, cy, w, h = a / iw, b / ih, c / iw, d / ih
+            elif c > a and d > b and c <= iw and d <= ih:
+                w = c - a
+                h = d - b
+                cx, cy, w, h = (a + w / 2.0) / iw, (b + h / 2.0) / ih, w / iw, h / ih
+            else:
+                cx, cy, w, h = (a + c / 2.0) / iw, (b + d / 2.0) / ih, c / iw, d / ih
+        else:
+            cx, cy, w, h = a, b, c, d
+        if not (0 <= cx <= 1 and 0 <= cy <= 1 and 0 < w <= 1 and 0 < h <= 1):
+            cx, cy, w, h = _clamp(cx), _clamp(cy), _clamp(w), _clamp(h)
+        out[i, 0], out[i, 1], out[i, 2], out[i, 3] = cx, cy, w, h
+
+if njit is not None:
+    # no parallel=True: files are already spread over a process pool, per-file threads would oversubscribe
+    _clamp = njit(cache=True)(_clamp)
+    _convert_batch = njit(cache=True)(_convert_batch)
+    # compile (or load from cache) now so the first label file isn't slow
+    _convert_batch(np.zeros((1, 4)), 0, 0, np.empty((1, 4)))
+
+def _safe_img_size(img_path):
+    try:
+        return _img_size(str(img_path))
+    except:
+        return None
+
+def prefetch_sizes(img_paths, max_workers=32):
+    """{stem: (iw, ih)} for the given images, read concurrently (headers only)."""
+    img_paths = list(img_paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        sizes = pool.map(_safe_img_size, img_paths)
+        return {p.stem: size for p, size in zip(img_paths, sizes) if size}
+
+def fix_label_file(txt_path, img_size=None, nc=1):
     """
+    img_size: (width, height) of the paired image, or None if unknown
     Return: (fixed_lines_list, status_msg)
     fixed_lines_list: list of strings to write (or empty)
     status_msg: explanation (fixed / deleted / skipped)
     """
-    text = txt_path.read_text(encoding="utf-8", errors="ignore").strip()
+    return fix_label_text(txt_path.read_text(encoding="utf-8", errors="ignore"), img_size, nc)
+
+def fix_label_text(text, img_size=None, nc=1):
+    """fix_label_file on already-read file contents."""
+    text = text.strip()
     if text == "":
         return ([], "empty_deleted")
 
     lines = text.splitlines()
-    fixed_lines = []
-    iw, ih = None, None
-    if img_path.exists():
-        try:
-            with Image.open(img_path) as im:
-                iw, ih = im.size
-        except:
-            iw, ih = None, None
-
-    for li, line in enumerate(lines):
-        orig = line.strip()
-        if orig == "":
-            continue
-        parts = orig.replace(",", " ").split()
-        # handle classname text
-        # if first token is non-numeric, set class = 0
-        cls_token = parts[0]
-        cls_val = safe_float(cls_token)
-        if cls_val is None:
-            cls = 0
-        else:
-            # if float, cast to int
-            cls = int(cls_val)
-
-        # for single class project, ensure class is 0
-        if nc == 1:
-            cls = 0
+    iw, ih = img_size if img_size else (None, None)
 
-        coords = parts[1:]
-        # if there are more than 4 coords, attempt to trim to 4
-        if len(coords) > 4:
-            coords = coords[:4]
-        # if fewer than 4 coords, cannot fix reliably (skip)
-        if len(coords) < 4:
-            # try to salvage if there are 3 coords and all <=1 (maybe missing width/height)
-            # but safest is to skip this line
+    # tokenising stays per line (mixed separators / class names), the maths is vectorised below
+    classes = []
+    rows = []
+    for line in lines:
+        parts = line.replace(",", " ").split()
+        # need a class token plus at least 4 coords; extra coords are trimmed
+        if len(parts) < 5:
             continue
-
-        # parse floats
-        coords_f = [safe_float(c) for c in coords]
+        coords_f = [safe_float(c) for c in parts[1:5]]
         if any(v is None for v in coords_f):
             # cannot parse -> skip
             continue
-
-        # coords_f now has 4 floats: c0,c1,c2,c3
-        a,b,c,d = coords_f
-
-        # If image size available and any coordinate >1 -> treat as pixel format (various possibilities)
-        if iw and ih and (a > 1 or b > 1 or c > 1 or d > 1):
-            # Two common pixel formats:
-            # 1) x_center_px, y_center_px, w_px, h_px
-            #    detect: w_px or h_px > 1 and x_center_px < iw and y_center_px < ih
-            # 2) x1_px, y1_px, x2_px, y2_px
-            #    detect: (c > a) and (d > b) and c<=iw and d<=ih
-            if (c > 1 and d > 1) and (a <= iw and b <= ih):
-                # Guess case 1: center_x, center_y, w_px, h_px
-                cx_px, cy_px, w_px, h_px = a,b,c,d
-                cxn, cyn, wn, hn = (cx_px/iw, cy_px/ih, w_px/iw, h_px/ih)
-            elif (c > a and d > b) and (c <= iw and d <= ih):
-                # case 2: x1,y1,x2,y2
-                cxn, cyn, wn, hn = convert_xyxy_to_xywh_norm(a,b,c,d, iw, ih)
-            else:
-                # fallback: treat as center,w,h in pixels
-                cxn, cyn, wn, hn = convert_xywh_pixels_to_norm(a,b,c,d, iw, ih)
+        if nc == 1:
+            # single class project: class is always 0
+            cls = 0
         else:
-            # assume coords are already normalized center x,y,w,h in [0,1]
-            cxn, cyn, wn, hn = a, b, c, d
-
-        # validate normalized numbers
-        if not (0 <= cxn <= 1 and 0 <= cyn <= 1 and 0 < wn <= 1 and 0 < hn <= 1):
-            # attempt to clamp to [1e-6, 1]
-            cxn = min(max(cxn, 1e-6), 1.0)
-            cyn = min(max(cyn, 1e-6), 1.0)
-            wn = min(max(wn, 1e-6), 1.0)
-            hn = min(max(hn, 1e-6), 1.0)
-
-        fixed_lines.append(f"{cls} {cxn:.6f} {cyn:.6f} {wn:.6f} {hn:.6f}")
-
-    if fixed_lines:
-        return (fixed_lines, "fixed")
-    else:
+            # non-numeric class name -> 0, float -> int
+            cls_val = safe_float(parts[0])
+            cls = 0 if cls_val is None else int(cls_val)
+        classes.append(cls)
+        rows.append(coords_f)
+
+    if not rows:
         return ([], "deleted")
 
+    arr = np.array(rows, dtype=np.float64)
+    out = np.empty_like(arr)
+    _convert_batch(arr, iw or 0, ih or 0, out)
+
+    fixed_lines = [f"{cls} {x:.6f} {y:.6f} {w:.6f} {h:.6f}" for cls, (x, y, w, h) in zip(classes, out.tolist())]
+    return (fixed_lines, "fixed")
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".tif", ".tiff"}
+
+def _image_index(img_dir):
+    """{stem: image path} for one images/ dir, built from a single scandir pass."""
+    index = {}
+    if not img_dir.exists():
+        return index
+    with os.scandir(img_dir) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in IMG_EXTS and entry.is_file():
+                index.setdefault(stem, Path(entry.path))
+    return index
+
+def _label_files(label_dir):
+    """All *.txt label files in label_dir, listed with a single scandir pass."""
+    with os.scandir(label_dir) as it:
+        return [Path(e.path) for e in it if e.name.endswith(".txt") and e.is_file(follow_symlinks=False)]
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _process_one(txt, img_size, known_digest=None):
+    """Worker: analyse one label file. Returns (status, payload, digest of the file after fixing)."""
+    data = txt.read_bytes()
+    digest = _digest(data)
+    # unchanged since the last run left it valid
+    if digest == known_digest:
+        return ("cached", None, digest)
+    # already canonical single-class labels, no float parsing needed
+    if _VALID_LABELS.fullmatch(data):
+        return ("valid", None, digest)
+    fixed_lines, status = fix_label_text(data.decode("utf-8", errors="ignore"), img_size)
+    if status != "fixed":
+        return (status, None, None)
+    # label content is digits/spaces only, so encode once as ascii
+    payload = "\n".join(fixed_lines).encode("ascii")
+    return (status, payload, _digest(payload))
+
+def _load_cache():
+    try:
+        return json.loads(CACHE.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def _write_all(writes):
+    """Second pass: rewrite every fixed label with one open/write/close."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    for path, payload in writes:
+        fd = os.open(path, flags, 0o644)
+        try:
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
+
+def _unlink_all(paths):
+    deleted = 0
+    for path in paths:
+        try:
+            os.unlink(path)
+            deleted += 1
+        except OSError:
+            pass
+    return deleted
+
 def main():
-    total_fixed = 0
-    total_deleted = 0
     total_checked = 0
+    total_skipped = 0
     report_lines = []
+    writes = []
+    deletes = []
+    cache = _load_cache()
+    new_cache = {}
+
+    # pair labels with images and read every needed image size up front
+    jobs = []
     for subset in SUBSETS:
         label_dir = DATASET / subset / "labels"
         img_dir = DATASET / subset / "images"
         if not label_dir.exists():
-            report_lines.append(f"Missing label dir: {label_dir}")
+            jobs.append((subset, None, None, None))
             continue
-        for txt in label_dir.glob("*.txt"):
-            total_checked += 1
-            # find corresponding image (try common extensions)
-            base = txt.stem
-            img_path = None
-            for ext in [".jpg", ".jpeg", ".png", ".tif", ".tiff"]:
-                cand = img_dir / (base + ext)
-                if cand.exists():
-                    img_path = cand
-                    break
-            if img_path is None:
-                # try without suffix modifications (some datasets have different naming) - try any file starting with stem
-                matches = list(img_dir.glob(base + "*"))
-                if matches:
-                    img_path = matches[0]
-            fixed_lines, status = fix_label_file(txt, img_path)
-            if status == "fixed":
-                txt.write_text("\n".join(fixed_lines))
-                total_fixed += 1
-            elif status == "deleted":
-                try:
-                    txt.unlink()
-                    total_deleted += 1
-                except Exception:
-                    pass
-            report_lines.append(f"{subset} {txt.name} -> {status} (img={'yes' if img_path else 'no'})")
+        img_index = _image_index(img_dir)
+        paths = _label_files(label_dir)
+        img_paths = [img_index.get(txt.stem) for txt in paths]
+        sizes = prefetch_sizes(p for p in img_paths if p is not None)
+        jobs.append((subset, paths, img_paths, sizes))
+
+    # None = one worker per CPU, capped at 61 on Windows (a larger explicit count raises ValueError there)
+    with ProcessPoolExecutor(max_workers=None) as executor:
+        for subset, paths, img_paths, sizes in jobs:
+            if paths is None:
+                report_lines.append(f"Missing label dir: {DATASET / subset / 'labels'}")
+                continue
+            total_checked += len(paths)
+            dims = [sizes.get(txt.stem) for txt in paths]
+            known = [cache.get(str(txt)) for txt in paths]
+            results = executor.map(_process_one, paths, dims, known, chunksize=64)
+            for txt, img_path, (status, payload, digest) in zip(paths, img_paths, results):
+                if status == "fixed":
+                    writes.append((txt, payload))
+                elif status == "deleted":
+                    deletes.append(txt)
+                elif status in ("cached", "valid"):
+                    total_skipped += 1
+                if digest is not None:
+                    new_cache[str(txt)] = digest
+                report_lines.append(f"{subset} {txt.name} -> {status} (img={'yes' if img_path else 'no'})")
+
+    # analysis is done; apply all changes in two batched passes
+    _write_all(writes)
+    total_fixed = len(writes)
+    total_deleted = _unlink_all(deletes)
+    CACHE.write_text(json.dumps(new_cache), encoding="utf-8")
 
     summary = [
         f"Dataset fix report",
         f"Total label files checked: {total_checked}",
+        f"Total skipped (already valid): {total_skipped}",
         f"Total fixed files (rewritten): {total_fixed}",
         f"Total deleted files (unfixable): {total_deleted}",
         ""
@@ -1,5 +1,4 @@
 # models/inference.py
-from ultralytics import YOLO
 from pathlib import Path
 import sys
 
@@ -8,15 +7,32 @@ WEIGHTS = ROOT / "results" / "tivaan_yolov8_train" / "weights" / "best.pt"
 VAL_IMAGES = ROOT / "DroneVehiclesDatasetYOLO" / "val" / "images"
 OUT_DIR = ROOT / "results" / "inference_outputs"
 
-if not WEIGHTS.exists():
-    print("ERROR: Weights not found. Please train first.")
-    sys.exit(1)
-if not VAL_IMAGES.exists():
-    print("ERROR: Validation images not found at:", VAL_IMAGES)
-    sys.exit(1)
+def main():
+    if not WEIGHTS.exists():
+        print("ERROR: Weights not found. Please train first.")
+        sys.exit(1)
+    if not VAL_IMAGES.exists():
+        print("ERROR: Validation images not found at:", VAL_IMAGES)
+        sys.exit(1)
 
-OUT_DIR.mkdir(parents=True, exist_ok=True)
-print("Running inference on:", VAL_IMAGES)
-model = YOLO(str(WEIGHTS))
-model.predict(source=str(VAL_IMAGES), save=True, project=str(OUT_DIR), name="predictions")
-print("✅ Inference done. Outputs in:", OUT_DIR)
+    import torch
+    from _loader import load_model
+
+    # FP16 on CUDA, FP32 on CPU (half is ignored there anyway)
+    cuda = torch.cuda.is_available()
+    device = 0 if cuda else "cpu"
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    print("Running inference on:", VAL_IMAGES, "(device:", "cuda" if cuda else "cpu", ")")
+    model = load_model(str(WEIGHTS))
+    # stream=True yields results lazily instead of holding the whole val set in memory;
+    # the generator must be consumed for predictions to run and be saved
+    results = model.predict(source=str(VAL_IMAGES), save=True, half=cuda, device=device,
+                            project=str(OUT_DIR), name="predictions", stream=True, imgsz=640, batch=16)
+    n = 0
+    for _ in results:
+        n += 1
+    print(f"✅ Inference done on {n} images. Outputs in:", OUT_DIR)
+
+if __name__ == "__main__":
+    main()
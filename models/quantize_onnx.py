@@ -0,0 +1,25 @@
+# models/quantize_onnx.py
+# Build an INT8 dynamically-quantized ONNX model (best_int8.onnx, next to best.pt) for CPU-only hosts.
+# backend.py prefers it over best.pt when no GPU is available.
+# Needs: pip install onnx onnxruntime onnxsim
+from ultralytics import YOLO
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from pathlib import Path
+import numpy as np
+
+weights = Path("D:/Dhruhi Nuv/College/Tivaan_Vision/results/tivaan_yolov8_train/weights/best.pt")
+if not weights.exists():
+    raise FileNotFoundError("best.pt not found. Train first!")
+
+model = YOLO(str(weights))
+# dynamic=True so the backend can send micro-batches of any size
+onnx_path = model.export(format="onnx", opset=13, simplify=True, dynamic=True, imgsz=640)
+int8_path = weights.with_name("best_int8.onnx")
+# QUInt8: signed int8 weights turn the Conv layers into ConvInteger(int8) nodes, which
+# ONNX Runtime's CPU provider has no kernel for; uint8 weights are supported.
+quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QUInt8)
+
+# make sure ONNX Runtime can actually run it, else backend.py silently falls back to best.pt
+check = YOLO(str(int8_path), task="detect")
+check.predict(np.zeros((640, 640, 3), dtype=np.uint8), imgsz=640, device="cpu", verbose=False)
+print("✅ INT8 ONNX model written to:", int8_path)
@@ -1,40 +1,73 @@
 from pathlib import Path
+from collections import deque
+import os
+import re
 
-DATASET = Path("D:/Dhruhi Nuv/College/Tivaan_Vision/DroneVehiclesDatasetYOLO")
+ROOT = Path("D:/Dhruhi Nuv/College/Tivaan_Vision")
+DATASET = ROOT / "DroneVehiclesDatasetYOLO"
+BAD_LOG = ROOT / "bad_labels.log"  # every problem found, one "path<TAB>reason" line each
 subsets = ["train", "val", "test"]
 
+# one "0 x y w h" line: x, y in [0, 1], w, h in (0, 1], at most 6 decimals
+_XY = rb"(?:0\.\d{1,6}|1\.0{1,6})"
+_WH = rb"(?:0\.(?!0{1,6}(?!\d))\d{1,6}|1\.0{1,6})"
+_LINE = rb"0 %s %s %s %s" % (_XY, _XY, _WH, _WH)
+_VALID_LABELS = re.compile(rb"(?:%s\r?\n)*%s\s*" % (_LINE, _LINE))
+
+def label_files(label_dir):
+    """All *.txt label files in label_dir, listed with a single scandir pass."""
+    if not label_dir.exists():
+        return []
+    with os.scandir(label_dir) as it:
+        return [Path(e.path) for e in it if e.name.endswith(".txt") and e.is_file(follow_symlinks=False)]
+
+def check_file(txt):
+    """Problem description for one label file, or None if it is fine."""
+    try:
+        data = txt.read_bytes()
+        # common case: canonical labels, validated in one regex sweep without float parsing
+        if _VALID_LABELS.fullmatch(data):
+            return None
+        lines = data.decode("utf-8").strip().splitlines()
+        if not lines:
+            return "empty"
+        for line in lines:
+            parts = line.strip().split()
+            if len(parts) != 5:
+                return "wrong number of values"
+            cls, x, y, w, h = map(float, parts)
+            if not (0 <= cls < 1):
+                # If cls is 1 but nc=1, this is wrong
+                return f"invalid class {cls}"
+            if not (0 <= x <= 1 and 0 <= y <= 1 and 0 < w <= 1 and 0 < h <= 1):
+                return "non-normalized coords"
+    except Exception as e:
+        return f"error: {e}"
+    return None
+
 def check_labels():
-    bad_files = []
-    for subset in subsets:
-        label_dir = DATASET / subset / "labels"
-        txt_files = list(label_dir.glob("*.txt"))
-        print(f"\nChecking {subset} ({len(txt_files)} label files)")
-        for txt in txt_files:
-            try:
-                lines = txt.read_text().strip().splitlines()
-                if not lines:
-                    bad_files.append((txt, "empty"))
+    # problems stream to BAD_LOG; only a count and the first 20 stay in memory
+    bad_count = 0
+    first_bad = deque(maxlen=20)
+    with open(BAD_LOG, "wb", buffering=1 << 20) as bad_log:
+        for subset in subsets:
+            label_dir = DATASET / subset / "labels"
+            txt_files = label_files(label_dir)
+            print(f"\nChecking {subset} ({len(txt_files)} label files)")
+            for txt in txt_files:
+                msg = check_file(txt)
+                if msg is None:
                     continue
-                for line in lines:
-                    parts = line.strip().split()
-                    if len(parts) != 5:
-                        bad_files.append((txt, "wrong number of values"))
-                        break
-                    cls, x, y, w, h = map(float, parts)
-                    if not (0 <= cls < 1):
-                        # If cls is 1 but nc=1, this is wrong
-                        bad_files.append((txt, f"invalid class {cls}"))
-                        break
-                    if not (0 <= x <= 1 and 0 <= y <= 1 and 0 < w <= 1 and 0 < h <= 1):
-                        bad_files.append((txt, "non-normalized coords"))
-                        break
-            except Exception as e:
-                bad_files.append((txt, f"error: {e}"))
-    if bad_files:
+                bad_log.write(b"%s\t%s\n" % (os.fsencode(str(txt)), msg.encode("utf-8")))
+                if bad_count < 20:
+                    first_bad.append((txt, msg))
+                bad_count += 1
+    if bad_count:
         print("\n⚠️ Found problematic label files:")
-        for f, msg in bad_files[:20]:  # show first 20
+        for f, msg in first_bad:  # show first 20
             print(f"  {f} → {msg}")
-        print(f"Total bad files: {len(bad_files)}")
+        print(f"Total bad files: {bad_count}")
+        print(f"Full list written to {BAD_LOG}")
     else:
         print("\n✅ All label files look fine!")
 
@@ -0,0 +1,82 @@
+# simulator_common.py
+"""
+Shared sender for the IoT simulators: readings are queued and POSTed to /api/iot
+as JSON arrays over one keep-alive connection.
+"""
+import requests, time, threading
+import numpy as np
+from collections import deque
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    dumps = orjson.dumps
+except ImportError:
+    import json
+
+    def dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+API = "http://127.0.0.1:8501/api/iot"  # same port used by backend.py
+FLUSH_INTERVAL = 30  # seconds between batched POSTs
+MAX_BATCH = 64
+RETRY_INTERVAL = 5  # seconds between retries while the backend is unreachable
+RNG_BUF = 4096  # random samples generated per refill
+
+# one keep-alive connection reused for every sample
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+JSON_HEADERS = {"Content-Type": "application/json"}
+buffer = deque(maxlen=MAX_BATCH)  # while the backend is unreachable the oldest samples drop
+_buffer_lock = threading.Lock()
+_urgent = threading.Event()  # set when a sensor enters the alert state, to flush right away
+_alerting = set()  # sensors whose last reading was an alert
+
+def uniform_stream(low, high, size=RNG_BUF):
+    """Endless uniform samples, drawn from PCG64 one buffer at a time."""
+    rng = np.random.default_rng()
+    while True:
+        yield from rng.uniform(low, high, size).tolist()
+
+def queue_reading(payload):
+    """
+    Queue one reading. The first alert from a sensor is sent immediately; further alerts
+    while it stays in the alert state go out with the next regular flush.
+    """
+    with _buffer_lock:
+        buffer.append(payload)
+    sensor = payload.get("sensor")
+    if payload.get("alert"):
+        if sensor not in _alerting:
+            _alerting.add(sensor)
+            _urgent.set()
+    else:
+        _alerting.discard(sensor)
+
+def flush(url=API):
+    """POST up to MAX_BATCH queued readings. On failure they go back to the front of the buffer."""
+    with _buffer_lock:
+        batch = [buffer.popleft() for _ in range(min(len(buffer), MAX_BATCH))]
+    if not batch:
+        return True
+    try:
+        r = session.post(url, data=dumps(batch), headers=JSON_HEADERS, timeout=2)
+    except requests.RequestException as e:
+        # re-queue ahead of newer samples; extend() on the bounded deque drops from the old end
+        with _buffer_lock:
+            pending = batch + list(buffer)
+            buffer.clear()
+            buffer.extend(pending)
+        print("send failed, will retry:", e)
+        return False
+    print("sent:", len(batch), "samples", "resp:", r.status_code)
+    return True
+
+def run(produce, flush_interval=FLUSH_INTERVAL, url=API):
+    """Start produce() on a daemon thread and flush the buffer every flush_interval seconds (never returns)."""
+    threading.Thread(target=produce, daemon=True).start()
+    wait = flush_interval
+    while True:
+        _urgent.wait(wait)
+        _urgent.clear()
+        wait = flush_interval if flush(url) else RETRY_INTERVAL
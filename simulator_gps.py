@@ -1,21 +1,28 @@
-import requests, time, random
+import time
+from simulator_common import queue_reading, run, uniform_stream
 
-URL = "http://127.0.0.1:8501/api/iot"
+SAMPLE_INTERVAL = 4  # seconds between readings
 
 lat, lon = 22.3011, 73.1925
+lat_steps = uniform_stream(-0.0003, 0.0003)
+lon_steps = uniform_stream(-0.0003, 0.0003)
 
-while True:
-    lat += random.uniform(-0.0003, 0.0003)
-    lon += random.uniform(-0.0003, 0.0003)
+def produce():
+    global lat, lon
+    while True:
+        lat += next(lat_steps)
+        lon += next(lon_steps)
 
-    payload = {
-        "sensor": "gps",
-        "distance_cm": 0,
-        "alert": False,
-        "gps": f"{lat:.6f},{lon:.6f}"
-    }
+        payload = {
+            "sensor": "gps",
+            "distance_cm": 0,
+            "alert": False,
+            "gps": f"{lat:.6f},{lon:.6f}"
+        }
 
-    print("GPS:", payload)
-    requests.post(URL, json=payload)
+        print("GPS:", payload)
+        queue_reading(payload)
 
-    time.sleep(4)
+        time.sleep(SAMPLE_INTERVAL)
+
+run(produce)
@@ -1,20 +1,26 @@
-import requests, time, random
+import time
+from simulator_common import queue_reading, run, uniform_stream
 
-URL = "http://127.0.0.1:8501/api/iot"
+SAMPLE_INTERVAL = 5  # seconds between readings
 
-while True:
-    dist = random.uniform(5, 150)
-    alert = dist < 30
-    gps = "22.3011,73.1925"
+dists = uniform_stream(5, 150)
 
-    payload = {
-        "sensor": "ultrasonic",
-        "distance_cm": round(dist, 2),
-        "alert": alert,
-        "gps": gps
-    }
+def produce():
+    while True:
+        dist = next(dists)
+        alert = dist < 30
+        gps = "22.3011,73.1925"
 
-    print("Sending:", payload)
-    requests.post(URL, json=payload)
+        payload = {
+            "sensor": "ultrasonic",
+            "distance_cm": round(dist, 2),
+            "alert": alert,
+            "gps": gps
+        }
 
-    time.sleep(5)
+        print("Queued:", payload)
+        queue_reading(payload)
+
+        time.sleep(SAMPLE_INTERVAL)
+
+run(produce)
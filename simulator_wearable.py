@@ -1,15 +1,20 @@
-import requests, time
-URL = "http://127.0.0.1:8501/api/iot"
+import time
+from simulator_common import queue_reading, run
 
-while True:
-    payload = {
-        "sensor": "wearable",
-        "distance_cm": 0,
-        "alert": True,
-        "gps": "22.3011,73.1925"
-    }
+SAMPLE_INTERVAL = 10  # seconds between readings
 
-    print("Wearable alert:", payload)
-    requests.post(URL, json=payload)
+def produce():
+    while True:
+        payload = {
+            "sensor": "wearable",
+            "distance_cm": 0,
+            "alert": True,
+            "gps": "22.3011,73.1925"
+        }
 
-    time.sleep(10)
+        print("Wearable alert:", payload)
+        queue_reading(payload)
+
+        time.sleep(SAMPLE_INTERVAL)
+
+run(produce)
@@ -45,6 +45,18 @@ console.log("[TivaanVision app.js] loaded", new Date().toISOString());
     el.innerHTML = html;
     el.className = klass ? klass : "";
   }
+  // annotated images are written asynchronously by the backend, so the first
+  // request can race the write; retry a few times before giving up
+  function setImgWithRetry(imgEl, src, retries = 5) {
+    if (!imgEl) return;
+    if (!src || src.startsWith("data:")) { imgEl.onerror = null; imgEl.src = src; return; }
+    const base = src.split("?")[0];
+    imgEl.onerror = () => {
+      if (retries-- <= 0) { imgEl.onerror = null; return; }
+      setTimeout(() => { imgEl.src = base + "?t=" + Date.now(); }, 150);
+    };
+    imgEl.src = src;
+  }
   function showImg(imgEl, src) {
     if (!imgEl) return;
     if (!src) { imgEl.style.display = "none"; return; }
@@ -180,7 +192,7 @@ console.log("[TivaanVision app.js] loaded", new Date().toISOString());
         if (annotatedEl) {
           if (outImg) {
             // if backend returned data URL, use it directly; else use path
-            annotatedEl.src = outImg;
+            setImgWithRetry(annotatedEl, outImg);
             annotatedEl.style.display = "block";
           } else {
             annotatedEl.style.display = "none";
@@ -213,7 +225,8 @@ console.log("[TivaanVision app.js] loaded", new Date().toISOString());
   window.TivaanVision = {
     attachDetectHandlers,
     injectThemeToggle,
-    refreshMetricsThumbnails
+    refreshMetricsThumbnails,
+    setImgWithRetry
   };
 
   console.log("[TivaanVision] handlers attached. If you add new DOM elements, call window.TivaanVision.attachDetectHandlers()");
@@ -0,0 +1,8 @@
+# wsgi.py
+"""
+WSGI entry point for running the backend under a production server, e.g.:
+    gunicorn -w 2 --threads 8 --bind 0.0.0.0:8501 wsgi:application
+"""
+from backend import app
+
+application = app